@@ -1,23 +1,47 @@
 #!/usr/bin/env python3
 
 import argparse
+import io
 import sys
+from urllib.parse import urlparse
+from urllib.request import urlopen
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 
 DEFAULT_URL = "https://gml.noaa.gov/aftp/data/hats/hcfcs/hcfc142b/flasks/HCFC142B_GCMS_flask.txt"
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
 
 
-def load_flask_data(source: str) -> pd.DataFrame:
-    """Load a NOAA flask text file into a pandas DataFrame."""
+def read_flask_table(source: str) -> pa.Table:
+    """Parse a NOAA flask file from a URL or local path with pyarrow's CSV reader."""
+    if urlparse(source).scheme in ("http", "https"):
+        with urlopen(source, timeout=60) as response:
+            source = io.BytesIO(response.read())
     # NOAA GML flask files use:
     # - line 1: metadata
     # - line 2: tab-delimited column names
-    df = pd.read_csv(
-        source, sep="\t", skiprows=1, engine="python", na_values=["nd", "-99"]
+    return pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(skip_rows=1),
+        parse_options=pa_csv.ParseOptions(delimiter="\t"),
+        convert_options=pa_csv.ConvertOptions(
+            null_values=["", "nd", "-99"], strings_can_be_null=True
+        ),
     )
+
+
+def load_flask_data(source: str) -> pd.DataFrame:
+    """Load a NOAA flask text file into a pandas DataFrame."""
+    df = read_flask_table(source).to_pandas()
     df.columns = [str(c).strip() for c in df.columns]
-    df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
+    df = df.loc[:, (df.columns != "") & ~df.columns.str.startswith("Unnamed")]
+    # pyarrow matches null_values as exact strings, so spellings like "-99.00"
+    # survive the parse; apply the missing-value sentinel numerically too.
+    num_cols = df.select_dtypes("number").columns
+    df[num_cols] = df[num_cols].mask(df[num_cols] == -99)
 
     lower_cols = {c.lower(): c for c in df.columns}
     datetime_col = lower_cols.get("yyyymmdd hhmmss")
@@ -31,18 +55,32 @@ def load_flask_data(source: str) -> pd.DataFrame:
 
     needed = {"year", "month", "day", "hour", "minute", "second"}
     if needed.issubset(lower_cols):
-        df["datetime_utc"] = pd.to_datetime(
-            {
-                "year": df[lower_cols["year"]],
-                "month": df[lower_cols["month"]],
-                "day": df[lower_cols["day"]],
-                "hour": df[lower_cols["hour"]],
-                "minute": df[lower_cols["minute"]],
-                "second": df[lower_cols["second"]],
-            },
-            utc=True,
-            errors="coerce",
-        )
+        parts = df[[lower_cols[name] for name in ("year", "month", "day", "hour", "minute", "second")]]
+        parts = parts.apply(pd.to_numeric, errors="coerce") if (parts.dtypes == object).any() else parts
+        parts = parts.to_numpy(dtype=float).T
+        # Build epoch seconds with integer arithmetic; rows with a missing part
+        # or an impossible month/day become NaT, as with the old
+        # errors="coerce" parse.
+        valid = np.isfinite(parts).all(axis=0)
+        year, month, day, hour, minute, second = np.where(valid, parts, 1).astype(np.int64)
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        valid &= (month >= 1) & (month <= 12)
+        month = np.clip(month, 1, 12)
+        days_in_month = _DAYS_IN_MONTH[month - 1] + (leap & (month == 2))
+        valid &= (day >= 1) & (day <= days_in_month)
+
+        # Days since 1970-01-01 for a proleptic Gregorian date, counting
+        # years from March so the leap day falls at the end.
+        y = year - (month <= 2)
+        era = y // 400
+        yoe = y - era * 400
+        doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+        days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+        seconds = days * 86400 + hour * 3600 + minute * 60 + second
+        stamps = seconds.view("datetime64[s]")
+        stamps[~valid] = np.datetime64("NaT")
+        df["datetime_utc"] = pd.Series(stamps, index=df.index).dt.tz_localize("UTC")
 
     return df
 
@@ -1,82 +1,120 @@
 #!/usr/bin/env python3
 
-import json
-import math
 import re
+from bisect import bisect_left
 from datetime import datetime, timezone
 from typing import Optional
-from urllib.parse import urlencode
-from urllib.error import URLError
-from urllib.request import urlopen
 
+import numpy as np
+import requests
 import typer
+import yaml
+
+# 'YYYY-MM-DD HH:MM[:SS]' and 'YYYYMMDDHHMM[SS]'
+_DASHED_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}(?::\d{2})?")
+_COMPACT_DATETIME_RE = re.compile(r"\d{12}(?:\d{2})?")
+
+# Prefer the libyaml-backed loader when PyYAML was built with it.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Shared keep-alive session so repeated and concurrent day fetches reuse
+# connections to the archive host instead of handshaking per request.
+_HTTP_POOL_SIZE = 16
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(
+        pool_connections=_HTTP_POOL_SIZE, pool_maxsize=_HTTP_POOL_SIZE
+    ),
+)
 
 
 class ArchivedMetAPI:
     def __init__(self, sites_file: str = "noaa-sites.yaml") -> None:
         self.sites_file = sites_file
         self.base_url = "https://archive-api.open-meteo.com/v1/archive"
+        self._sites = None
 
     @staticmethod
-    def interp_direction_deg(dir1: float, dir2: float, frac: float) -> float:
-        """Circular interpolation for wind direction in degrees."""
-        a1 = math.radians(dir1)
-        a2 = math.radians(dir2)
+    def blend_direction_deg(cos1, sin1, cos2, sin2, frac) -> np.ndarray:
+        """Circular blend of two directions given as unit-vector components."""
+        x = (1 - frac) * cos1 + frac * cos2
+        y = (1 - frac) * sin1 + frac * sin2
 
-        x = (1 - frac) * math.cos(a1) + frac * math.cos(a2)
-        y = (1 - frac) * math.sin(a1) + frac * math.sin(a2)
+        return np.mod(np.rad2deg(np.arctan2(y, x)), 360.0)
 
-        ang = math.degrees(math.atan2(y, x))
-        return ang % 360
+    @staticmethod
+    def interp_direction_deg_vec(dir1, dir2, frac) -> np.ndarray:
+        """Circular interpolation for wind direction in degrees, elementwise."""
+        a1 = np.deg2rad(dir1)
+        a2 = np.deg2rad(dir2)
+        return ArchivedMetAPI.blend_direction_deg(
+            np.cos(a1), np.sin(a1), np.cos(a2), np.sin(a2), frac
+        )
+
+    @staticmethod
+    def interp_day_vec(hours_ns, ws, wd, row_ns):
+        """Interpolate wind speed/direction at many targets within one day.
+
+        ``hours_ns`` must be sorted; targets outside it take the nearest hour.
+        """
+        # Bracket every row at once; clamping frac to [0, 1] falls back to the
+        # nearest hour when a target isn't bracketed.
+        idx = np.clip(np.searchsorted(hours_ns, row_ns, side="right") - 1, 0, len(hours_ns) - 2)
+        t0 = hours_ns[idx]
+        frac = np.clip((row_ns - t0) / (hours_ns[idx + 1] - t0), 0.0, 1.0)
+
+        spd = (1 - frac) * ws[idx] + frac * ws[idx + 1]
+
+        # Direction unit vectors are computed once per hour and gathered,
+        # rather than recomputed for both endpoints of every row.
+        rad = np.deg2rad(wd)
+        cos_h = np.cos(rad)
+        sin_h = np.sin(rad)
+        direction = ArchivedMetAPI.blend_direction_deg(
+            cos_h[idx], sin_h[idx], cos_h[idx + 1], sin_h[idx + 1], frac
+        )
+        return spd, direction
+
+    @staticmethod
+    def interp_direction_deg(dir1: float, dir2: float, frac: float) -> float:
+        """Circular interpolation for wind direction in degrees."""
+        return float(ArchivedMetAPI.interp_direction_deg_vec(dir1, dir2, frac))
 
     @staticmethod
     def parse_target_datetime(value: str) -> datetime:
-        if re.fullmatch(r"\d{14}", value):
-            return datetime.strptime(value, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
-        if re.fullmatch(r"\d{12}", value):
-            return datetime.strptime(value, "%Y%m%d%H%M").replace(tzinfo=timezone.utc)
-        if re.fullmatch(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", value):
-            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(
-                tzinfo=timezone.utc
-            )
-        if re.fullmatch(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}", value):
-            return datetime.strptime(value, "%Y-%m-%d %H:%M").replace(
-                tzinfo=timezone.utc
+        if _DASHED_DATETIME_RE.fullmatch(value):
+            return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+        if _COMPACT_DATETIME_RE.fullmatch(value):
+            return datetime(
+                int(value[0:4]),
+                int(value[4:6]),
+                int(value[6:8]),
+                int(value[8:10]),
+                int(value[10:12]),
+                int(value[12:14] or 0),
+                tzinfo=timezone.utc,
             )
         raise typer.BadParameter(
             "Invalid datetime. Use 'YYYY-MM-DD HH:MM[:SS]' or 'YYYYMMDDHHMM[SS]'."
         )
 
     def load_sites(self) -> dict:
-        sites = {}
-        current = None
+        # Parsed once per instance; resolve_location calls this per lookup.
+        if self._sites is not None:
+            return self._sites
 
         try:
             with open(self.sites_file, "r", encoding="utf-8") as f:
-                for raw_line in f:
-                    line = raw_line.strip()
-                    if not line or ":" not in line:
-                        continue
-
-                    if line.startswith("- "):
-                        key, value = line[2:].split(":", 1)
-                        key = key.strip()
-                        value = value.strip()
-                        if key == "code":
-                            current = {"code": value, "name": value}
-                            sites[value.upper()] = current
-                        continue
-
-                    if current is None:
-                        continue
-
-                    key, value = line.split(":", 1)
-                    key = key.strip()
-                    value = value.strip()
-                    current[key] = value
+                entries = yaml.load(f, Loader=_YAML_LOADER) or []
         except FileNotFoundError as exc:
             raise SystemExit(f"Sites file not found: {self.sites_file}") from exc
 
+        sites = {}
+        for entry in entries:
+            code = str(entry["code"])
+            sites[code.upper()] = {"name": code, **entry, "code": code}
+
         for code, site in sites.items():
             try:
                 site["latitude"] = float(site["latitude"])
@@ -86,6 +124,7 @@ class ArchivedMetAPI:
                     f"Invalid lat/lon for site '{code}' in {self.sites_file}"
                 ) from exc
 
+        self._sites = sites
         return sites
 
     def resolve_location(
@@ -130,17 +169,12 @@ class ArchivedMetAPI:
             # "models": "era5",  # Keep default "best" model selection.
         }
 
-        query = urlencode(params)
-        request_url = f"{self.base_url}?{query}"
-
         try:
-            with urlopen(request_url, timeout=30) as response:
-                status = getattr(response, "status", 200)
-                if status != 200:
-                    raise RuntimeError(f"Open-Meteo request failed with HTTP {status}")
-                data = json.load(response)
-        except URLError as exc:
-            raise SystemExit(f"Failed to reach Open-Meteo API: {exc.reason}") from exc
+            response = _SESSION.get(self.base_url, params=params, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            raise SystemExit(f"Failed to reach Open-Meteo API: {exc}") from exc
+        data = response.json()
 
         return (
             data["hourly"]["time"],
@@ -158,24 +192,25 @@ class ArchivedMetAPI:
         if len(valid_points) < 2:
             raise SystemExit("Not enough valid wind data points returned for interpolation.")
 
+        # Hourly points are sorted, so bisect for the bracketing pair and take
+        # the nearest hour from the same pivot.
+        hour_times = [p[0] for p in valid_points]
+        i = bisect_left(hour_times, target_time) - 1
+        i = min(max(i, 0), len(valid_points) - 2)
+        t0, ws0, wd0 = valid_points[i]
+        t1, ws1, wd1 = valid_points[i + 1]
+
         interpolated = None
-        for i in range(len(valid_points) - 1):
-            t0, ws0, wd0 = valid_points[i]
-            t1, ws1, wd1 = valid_points[i + 1]
-            if t0 <= target_time <= t1:
-                frac = (target_time - t0).total_seconds() / (t1 - t0).total_seconds()
-                interpolated = (
-                    t0,
-                    t1,
-                    (1 - frac) * ws0 + frac * ws1,
-                    self.interp_direction_deg(wd0, wd1, frac),
-                )
-                break
+        if t0 <= target_time <= t1:
+            frac = (target_time - t0).total_seconds() / (t1 - t0).total_seconds()
+            interpolated = (
+                t0,
+                t1,
+                (1 - frac) * ws0 + frac * ws1,
+                self.interp_direction_deg(wd0, wd1, frac),
+            )
 
-        nearest_idx = min(
-            range(len(valid_points)),
-            key=lambda i: abs((valid_points[i][0] - target_time).total_seconds()),
-        )
+        nearest_idx = i if target_time - t0 <= t1 - target_time else i + 1
         nearest = valid_points[nearest_idx]
         return interpolated, nearest
 
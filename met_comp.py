@@ -1,24 +1,38 @@
 #! /usr/bin/env python
 
+import hashlib
 import os
+import pickle
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import numpy as np
 import pandas as pd
+import matplotlib
+
+matplotlib.use("Agg")  # Sites are plotted in worker processes with no display.
 import matplotlib.pyplot as plt
 
 from met_api import ArchivedMetAPI
 import flask_data
 
 api = ArchivedMetAPI("noaa-sites.yaml")
+SITES = api.load_sites()
 sites = ["alt", "brw", "cgo", "nwr", "hfm"]
 RESULTS_DIR = "results"
+FETCH_WORKERS = 16
+SCATTER_MAX_POINTS = 5000
+LARGE_SERIES_MARKERSIZE = 1.5
+GML_CACHE_MAX_AGE = 24 * 3600  # seconds
 FIGURE_START = pd.Timestamp("2020-01-01", tz="UTC")
-gml_df = None
 day_cache = {}
 
 class MetComparison:
-    def __init__(self, source_url, min_date="2020-01-01"):
+    def __init__(
+        self, source_url, min_date="2020-01-01", cache_dir=None, cache_max_age=GML_CACHE_MAX_AGE
+    ):
         self.source_url = source_url
+        self.cache_dir = cache_dir
+        self.cache_max_age = cache_max_age
         min_ts = pd.Timestamp(min_date)
         if min_ts.tzinfo is None:
             min_ts = min_ts.tz_localize("UTC")
@@ -26,7 +40,27 @@ class MetComparison:
             min_ts = min_ts.tz_convert("UTC")
         self.min_date = min_ts
 
+    def cache_path(self):
+        key = hashlib.sha1(f"{self.source_url}|{self.min_date.isoformat()}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"gml_cache_{key[:12]}.parquet")
+
     def load_gml_data(self):
+        """Load filtered flask data, reusing a fresh on-disk copy when cache_dir is set."""
+        if self.cache_dir is None:
+            return self.fetch_gml_data()
+
+        path = self.cache_path()
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < self.cache_max_age:
+            print(f"loading cached GML data from {path}")
+            return pd.read_parquet(path)
+
+        df = self.fetch_gml_data()
+        tmp_path = f"{path}.tmp"
+        df.to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        return df
+
+    def fetch_gml_data(self):
         df = flask_data.load_flask_data(self.source_url)
         df["datetime_utc"] = pd.to_datetime(df["datetime_utc"], errors="coerce", utc=True)
         df = (
@@ -36,70 +70,143 @@ class MetComparison:
             )
             .dropna(subset=["datetime_utc", "wind_spd", "wind_dir"])
             .loc[lambda d: d["wind_spd"].between(0, 100)]
+            .astype({"wind_spd": "float32", "wind_dir": "float32", "site": "category"})
         )
         return df.loc[df["datetime_utc"] > self.min_date]
 
 
-def api_wind_for_ts(site, ts):
-    if pd.isna(ts):
-        return (pd.NA, pd.NA)
-
-    lat, lon, _, _ = api.resolve_location(site, None, None)
-
-    ts = pd.Timestamp(ts)
-    if ts.tz is None:
-        ts = ts.tz_localize("UTC")
-    else:
-        ts = ts.tz_convert("UTC")
-
-    dt = ts.to_pydatetime()
-    day_key = (site, ts.date().isoformat())
-
+def day_cache_path(site):
+    # One file per site so concurrent site workers never write the same file.
+    return os.path.join(RESULTS_DIR, f"day_cache_{site}.pkl")
+
+
+def load_day_cache(site):
+    """Load a site's hourly API responses keyed by (site, iso_date) from disk."""
+    path = day_cache_path(site)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_day_cache(site):
+    path = day_cache_path(site)
+    site_days = {key: value for key, value in day_cache.items() if key[0] == site}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(site_days, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def site_location(site):
+    site_data = SITES.get(site.upper())
+    if site_data is None:
+        raise SystemExit(f"Unknown site '{site}'")
+    return site_data["latitude"], site_data["longitude"]
+
+
+def prefetch_days(site, lat, lon, dates, workers=FETCH_WORKERS):
+    """Fetch hourly API data for every uncached day concurrently."""
+    missing = sorted({d for d in dates if (site, d.isoformat()) not in day_cache})
+    if not missing:
+        return
+
+    print(f"[{site}] fetching {len(missing)} day(s) from API with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(api.fetch_hourly_wind, lat, lon, day): day for day in missing}
+        try:
+            for future in as_completed(futures):
+                day_cache[(site, futures[future].isoformat())] = future.result()
+        except BaseException:
+            # Drop the queued days but keep every day that did arrive so a
+            # rerun only fetches the remainder.
+            pool.shutdown(cancel_futures=True)
+            for future, day in futures.items():
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    day_cache[(site, day.isoformat())] = future.result()
+            save_day_cache(site)
+            raise
+    save_day_cache(site)
+
+
+def api_wind_for_day(site, lat, lon, day, row_ns):
+    """Interpolate API wind at every epoch-ns timestamp in ``row_ns``, all falling on ``day``."""
+    day_key = (site, day.isoformat())
     if day_key not in day_cache:
-        day_cache[day_key] = api.fetch_hourly_wind(lat, lon, dt)
+        day_cache[day_key] = api.fetch_hourly_wind(lat, lon, day)
 
     times, ws, wd = day_cache[day_key]
-    interpolated, nearest = api.interpolate_wind(times, ws, wd, dt)
-
-    if interpolated is not None:
-        _, _, spd, direction = interpolated
-        print(f"{site} at {ts.isoformat()}: using interpolated data for API wind ({spd} m/s, {direction} deg)")
-        return spd, direction
+    hours_ns = np.asarray(times, dtype="datetime64[ns]").astype(np.int64)
+    ws = np.asarray(ws, dtype=float)
+    wd = np.asarray(wd, dtype=float)
+    valid = ~(np.isnan(ws) | np.isnan(wd))
+    if valid.sum() < 2:
+        raise SystemExit("Not enough valid wind data points returned for interpolation.")
 
-    # Fallback if target isn't bracketed.
-    _, spd, direction = nearest
-    return spd, direction
+    return api.interp_day_vec(hours_ns[valid], ws[valid], wd[valid], row_ns)
 
 
-def enrich_site_with_api(site, site_df, progress_every=250):
-    total = len(site_df)
+def enrich_site_with_api(site, site_df, progress_every=250, fetch_workers=FETCH_WORKERS):
+    ts = pd.to_datetime(site_df["datetime_utc"], errors="coerce", utc=True)
+    total = int(ts.notna().sum())
     start = time.monotonic()
-    api_data = []
+    api_data = np.full((len(site_df), 2), np.nan, dtype=np.float32)
 
-    for i, ts in enumerate(site_df["datetime_utc"], start=1):
-        api_data.append(api_wind_for_ts(site, ts))
-        if i == 1 or i % progress_every == 0 or i == total:
+    lat, lon = site_location(site)
+    prefetch_days(site, lat, lon, ts.dropna().dt.date.unique(), workers=fetch_workers)
+
+    row_ns = ts.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    done = 0
+    for day, positions in ts.groupby(ts.dt.date).indices.items():
+        spd, direction = api_wind_for_day(site, lat, lon, day, row_ns[positions])
+        api_data[positions, 0] = spd
+        api_data[positions, 1] = direction
+
+        prev, done = done, done + len(positions)
+        if prev == 0 or prev // progress_every != done // progress_every or done == total:
             elapsed = time.monotonic() - start
-            rate = i / elapsed if elapsed > 0 else 0.0
-            remaining = total - i
+            rate = done / elapsed if elapsed > 0 else 0.0
+            remaining = total - done
             eta_seconds = remaining / rate if rate > 0 else float("inf")
             eta_text = f"{eta_seconds:.1f}s" if np.isfinite(eta_seconds) else "unknown"
             print(
-                f"[{site}] processed {i}/{total} ({i/total:.1%}) "
+                f"[{site}] processed {done}/{total} ({done/total:.1%}) "
                 f"elapsed={elapsed:.1f}s eta={eta_text}"
             )
 
-    api_cols = ["api_wind_spd", "api_wind_dir"]
-    site_df[api_cols] = pd.DataFrame(api_data, index=site_df.index)
+    site_df["api_wind_spd"] = api_data[:, 0]
+    site_df["api_wind_dir"] = api_data[:, 1]
     return site_df
 
 
-def save_comparison_csv(path, df):
-    out = df.copy()
-    if "dec_date" in out.columns:
-        dec = pd.to_numeric(out["dec_date"], errors="coerce")
-        out["dec_date"] = dec.map(lambda v: f"{v:.6f}" if pd.notna(v) else "")
-    out.to_csv(path, index=False, float_format="%.3f")
+def save_comparison(path, df):
+    df.to_parquet(path, compression="zstd", index=False)
+
+
+def scatter_series(ax, x, y, s, **kwargs):
+    """Scatter plot that switches to small dot markers for large series."""
+    if len(x) > SCATTER_MAX_POINTS:
+        return ax.plot(
+            x, y, linestyle="none", marker=".", markersize=LARGE_SERIES_MARKERSIZE, **kwargs
+        )
+    return ax.scatter(x, y, s=s, **kwargs)
+
+
+def series_legend(ax, n_points):
+    # Scale up the tiny large-series markers so the legend stays readable.
+    markerscale = 6.0 if n_points > SCATTER_MAX_POINTS else 1.0
+    ax.legend(markerscale=markerscale)
+
+
+def circular_diff_deg(obs_deg, ref_deg):
+    """Signed circular difference obs - ref in degrees, wrapped to [-180, 180)."""
+    # Wrapping the plain difference in place is equivalent to
+    # atan2(sin(d), cos(d)) without the trig or its temporaries.
+    diff = np.subtract(obs_deg, ref_deg, dtype=np.float64)
+    diff += 180.0
+    np.mod(diff, 360.0, out=diff)
+    diff -= 180.0
+    return diff
 
 
 def plot_wind_spd_comparison(site, site_df):
@@ -119,20 +226,21 @@ def plot_wind_spd_comparison(site, site_df):
     )
 
     # Top (1/4): difference
-    ax_top.scatter(subset["datetime_utc"], subset["spd_diff"], s=20, alpha=0.8, color="tab:red")
+    scatter_series(ax_top, subset["datetime_utc"], subset["spd_diff"], s=20, alpha=0.8, color="tab:red")
     ax_top.axhline(0, color="black", lw=1)
     ax_top.set_ylabel("obs-api")
     ax_top.set_title(f"Wind Speed Difference ({site.upper()})")
 
     # Bottom (3/4): main time series
-    ax_main.scatter(subset["datetime_utc"], subset["wind_spd"], s=15, alpha=0.7, label="Observed")
-    ax_main.scatter(subset["datetime_utc"], subset[api_spd_col], s=15, alpha=0.7, label="Reanalysis")
+    scatter_series(ax_main, subset["datetime_utc"], subset["wind_spd"], s=15, alpha=0.7, label="Observed")
+    scatter_series(ax_main, subset["datetime_utc"], subset[api_spd_col], s=15, alpha=0.7, label="Reanalysis")
     ax_main.set_ylabel("wind speed (m/s)")
     ax_main.set_xlabel("datetime_utc")
-    ax_main.legend()
+    series_legend(ax_main, len(subset))
 
     plt.tight_layout()
     plt.savefig(os.path.join(RESULTS_DIR, f"wind_speed_comparison_{site}.png"))
+    plt.close(fig)
 
 
 def plot_wind_dir_comparison(site, site_df):
@@ -144,67 +252,92 @@ def plot_wind_dir_comparison(site, site_df):
         .copy()
     )
 
-    # Circular signed difference: obs - api, in degrees, range [-180, 180]
-    obs_rad = np.deg2rad(subset["wind_dir"].to_numpy())
-    api_rad = np.deg2rad(subset[api_dir_col].to_numpy())
-    subset["dir_diff"] = np.rad2deg(np.arctan2(np.sin(obs_rad - api_rad), np.cos(obs_rad - api_rad)))
+    # Circular signed difference: obs - api, in degrees, range [-180, 180)
+    subset["dir_diff"] = circular_diff_deg(
+        subset["wind_dir"].to_numpy(), subset[api_dir_col].to_numpy()
+    )
 
     fig, (ax_top, ax_main) = plt.subplots(
         2, 1, figsize=(12, 8), sharex=True, gridspec_kw={"height_ratios": [1, 3]}
     )
 
     # Top (1/4): circular difference
-    ax_top.scatter(subset["datetime_utc"], subset["dir_diff"], s=20, alpha=0.8, color="tab:red")
+    scatter_series(ax_top, subset["datetime_utc"], subset["dir_diff"], s=20, alpha=0.8, color="tab:red")
     ax_top.axhline(0, color="black", lw=1)
     ax_top.set_ylabel("obs-api (deg)")
     ax_top.set_title(f"Wind Direction Difference (circular, {site.upper()})")
 
     # Bottom (3/4): main time series
-    ax_main.scatter(subset["datetime_utc"], subset["wind_dir"], s=15, alpha=0.7, label="Observed")
-    ax_main.scatter(subset["datetime_utc"], subset[api_dir_col], s=15, alpha=0.7, label="Reanalysis")
+    scatter_series(ax_main, subset["datetime_utc"], subset["wind_dir"], s=15, alpha=0.7, label="Observed")
+    scatter_series(ax_main, subset["datetime_utc"], subset[api_dir_col], s=15, alpha=0.7, label="Reanalysis")
     ax_main.set_ylabel("wind direction (deg)")
     ax_main.set_xlabel("datetime_utc")
-    ax_main.legend()
+    series_legend(ax_main, len(subset))
 
     plt.tight_layout()
     plt.savefig(os.path.join(RESULTS_DIR, f"wind_direction_comparison_{site}.png"))
+    plt.close(fig)
+
+
+def process_site(site, site_gml_df, fetch_workers=FETCH_WORKERS):
+    day_cache.clear()
+    day_cache.update(load_day_cache(site))
+    cache_path = os.path.join(RESULTS_DIR, f"{site}_gml_comparison.parquet")
+    legacy_csv_path = os.path.join(RESULTS_DIR, f"{site}_gml_comparison.csv")
+    if os.path.exists(cache_path):
+        print(f"[{site}] loading cached comparison data from {cache_path}")
+        site_df = pd.read_parquet(cache_path)
+    elif os.path.exists(legacy_csv_path):
+        print(f"[{site}] migrating cached comparison data from {legacy_csv_path}")
+        site_df = pd.read_csv(legacy_csv_path, parse_dates=["datetime_utc"])
+        # Backward compatibility with older per-site API column names.
+        legacy_cols = {
+            f"{site}_wind_spd": "api_wind_spd",
+            f"{site}_wind_dir": "api_wind_dir",
+        }
+        site_df = site_df.rename(
+            columns={
+                old: new
+                for old, new in legacy_cols.items()
+                if old in site_df.columns and new not in site_df.columns
+            }
+        )
+        if "api_wind_spd" in site_df.columns and "api_wind_dir" in site_df.columns:
+            save_comparison(cache_path, site_df)
+    else:
+        print(f"[{site}] cache miss; fetching API data and writing {cache_path}")
+        site_df = site_gml_df
+        if site_df.empty:
+            return
+        site_df = enrich_site_with_api(site, site_df, fetch_workers=fetch_workers)
+        save_comparison(cache_path, site_df)
+
+    if site_df.empty:
+        return
+    plot_wind_spd_comparison(site, site_df)
+    plot_wind_dir_comparison(site, site_df)
 
 
 def main():
-    global gml_df
     os.makedirs(RESULTS_DIR, exist_ok=True)
-    day_cache.clear()
     comparison = MetComparison(
-        "https://gml.noaa.gov/aftp/data/hats/hcfcs/hcfc142b/flasks/HCFC142B_GCMS_flask.txt"
+        "https://gml.noaa.gov/aftp/data/hats/hcfcs/hcfc142b/flasks/HCFC142B_GCMS_flask.txt",
+        cache_dir=RESULTS_DIR,
     )
     gml_df = comparison.load_gml_data()
 
-    for site in sites:
-        csv_path = os.path.join(RESULTS_DIR, f"{site}_gml_comparison.csv")
-        if os.path.exists(csv_path):
-            print(f"[{site}] loading cached comparison data from {csv_path}")
-            site_df = pd.read_csv(csv_path, parse_dates=["datetime_utc"])
-            # Backward compatibility with older per-site API column names.
-            legacy_spd_col = f"{site}_wind_spd"
-            legacy_dir_col = f"{site}_wind_dir"
-            if "api_wind_spd" not in site_df.columns and legacy_spd_col in site_df.columns:
-                site_df = site_df.rename(columns={legacy_spd_col: "api_wind_spd"})
-            if "api_wind_dir" not in site_df.columns and legacy_dir_col in site_df.columns:
-                site_df = site_df.rename(columns={legacy_dir_col: "api_wind_dir"})
-            if "api_wind_spd" in site_df.columns and "api_wind_dir" in site_df.columns:
-                save_comparison_csv(csv_path, site_df)
-        else:
-            print(f"[{site}] cache miss; fetching API data and writing {csv_path}")
-            site_df = gml_df.loc[gml_df["site"] == site].copy()
-            if site_df.empty:
-                continue
-            site_df = enrich_site_with_api(site, site_df)
-            save_comparison_csv(csv_path, site_df)
-
-        if site_df.empty:
-            continue
-        plot_wind_spd_comparison(site, site_df)
-        plot_wind_dir_comparison(site, site_df)
+    # Sites are independent, so each runs in its own process with only its
+    # slice of gml_df pickled across. The API fetch budget is split between
+    # them so in-flight requests stay at FETCH_WORKERS overall.
+    max_workers = min(len(sites), os.cpu_count() or 1)
+    fetch_workers = max(1, FETCH_WORKERS // max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(process_site, site, gml_df.loc[gml_df["site"] == site], fetch_workers)
+            for site in sites
+        ]
+        for future in futures:
+            future.result()
 
 
 if __name__ == "__main__":